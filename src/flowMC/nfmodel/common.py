@@ -16,16 +16,23 @@ from jaxtyping import Array, Float, PRNGKeyArray
 class MLP(eqx.Module):
     r"""Multilayer perceptron.
 
+    When all hidden layers share the same width, the hidden-to-hidden layers are
+    stored as stacked weights and applied with a single `jax.lax.scan`.
+
     Args:
         shape (List[int]): Shape of the MLP. The first element is the input dimension, the last element is the output dimension.
         key (PRNGKeyArray): Random key.
 
     Attributes:
-        layers (List): List of layers.
+        layers (List): List of linear layers that are not part of the stacked hidden layers.
+        hidden_weight (Array): Stacked weights of the hidden-to-hidden layers, shape (n_hidden, width, width).
+        hidden_bias (Array): Stacked biases of the hidden-to-hidden layers, shape (n_hidden, width).
         activation (Callable): Activation function.
-        use_bias (bool): Whether to use bias.
     """
     layers: List
+    hidden_weight: Float[Array, "n_hidden n_width n_width"] | None
+    hidden_bias: Float[Array, "n_hidden n_width"] | None
+    activation: Callable
 
     def __init__(
         self,
@@ -35,8 +42,11 @@ class MLP(eqx.Module):
         activation: Callable = jax.nn.relu,
         use_bias: bool = True,
     ):
-        self.layers = []
-        for i in range(len(shape) - 2):
+        n_hidden = len(shape) - 3
+        stack_hidden = n_hidden > 0 and len(set(shape[1:-1])) == 1
+        n_layers = 1 if stack_hidden else len(shape) - 2
+        layers = []
+        for i in range(n_layers):
             key, subkey1, subkey2 = jax.random.split(key, 3)
             layer = eqx.nn.Linear(
                 shape[i], shape[i + 1], key=subkey1, use_bias=use_bias
@@ -45,17 +55,46 @@ class MLP(eqx.Module):
                 scale / shape[i]
             )
             layer = eqx.tree_at(lambda l: l.weight, layer, weight)
-            self.layers.append(layer)
-            self.layers.append(activation)
+            layers.append(layer)
+
+        self.hidden_weight = None
+        self.hidden_bias = None
+        if stack_hidden:
+            # Initialize all the hidden-to-hidden layers at once.
+            width = shape[1]
+            key, subkey1, subkey2 = jax.random.split(key, 3)
+            self.hidden_weight = jax.random.normal(
+                subkey2, (n_hidden, width, width)
+            ) * jnp.sqrt(scale / width)
+            if use_bias:
+                # Same uniform initialization as the bias of eqx.nn.Linear.
+                limit = 1 / jnp.sqrt(width)
+                self.hidden_bias = jax.random.uniform(
+                    subkey1, (n_hidden, width), minval=-limit, maxval=limit
+                )
         key, subkey = jax.random.split(key)
-        self.layers.append(
-            eqx.nn.Linear(shape[-2], shape[-1], key=subkey, use_bias=use_bias)
-        )
+        output_layer = eqx.nn.Linear(shape[-2], shape[-1], key=subkey, use_bias=use_bias)
+        self.layers = layers + [output_layer]
+        self.activation = activation
 
     def __call__(self, x: Float[Array, "n_in"]) -> Float[Array, "n_out"]:
-        for layer in self.layers:
-            x = layer(x)
-        return x
+        # Compute in the dtype of the weights, e.g. for mixed precision training.
+        input_dtype = x.dtype
+        x = x.astype(self.dtype)
+        for layer in self.layers[:-1]:
+            x = self.activation(layer(x))
+
+        if self.hidden_weight is not None:
+
+            def f(x, params):
+                weight, bias = params
+                x = weight @ x
+                if bias is not None:
+                    x = x + bias
+                return self.activation(x), None
+
+            x, _ = jax.lax.scan(f, x, (self.hidden_weight, self.hidden_bias))
+        return self.layers[-1](x).astype(input_dtype)
 
     @property
     def n_input(self) -> int:
@@ -203,7 +203,7 @@ class RealNVP(NFModel):
     @eqx.filter_jit
     @partial(jax.vmap, in_axes=(None, 0))
     def log_prob(self, x: Array) -> Array:
-        x = (x - self.data_mean) / jnp.sqrt(jnp.diag(self.data_cov))
+        x = (x - self.data_mean) * jax.lax.rsqrt(jnp.diag(self.data_cov))
         y, log_det = self.__call__(x)
         log_det = log_det + jax.scipy.stats.multivariate_normal.logpdf(
             y, jnp.zeros(self.n_features), jnp.eye(self.n_features)
@@ -479,7 +479,7 @@ class MaskedCouplingRQSpline(NFModel):
     @partial(jax.vmap, in_axes=(None, 0))
     def log_prob(self, x: Float[Array, "n_sample n_dim"]) -> Float[Array, " n_sample"]:
         """From data space to latent space"""
-        x = (x - self.data_mean) / jnp.sqrt(jnp.diag(self.data_cov))
+        x = (x - self.data_mean) * jax.lax.rsqrt(jnp.diag(self.data_cov))
         y, log_det = self.__call__(x)
         log_det = log_det + self.base_dist.log_prob(y)
         return log_det
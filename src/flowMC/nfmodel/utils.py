@@ -3,12 +3,38 @@ import jax.numpy as jnp  # JAX NumPy
 from tqdm import trange, tqdm
 import optax
 import equinox as eqx
-from typing import Callable, Tuple
+from typing import Callable, Optional, Tuple
 from jaxtyping import Array, PRNGKeyArray, Float
+from flowMC.nfmodel.common import MLP
+
+
+def cast_mlp(model: eqx.Module, dtype: jnp.dtype) -> eqx.Module:
+    """
+    Cast the parameters of every MLP in a model to `dtype`.
+    Everything else, e.g. the base distribution and the data statistics, keeps its dtype.
+
+    Args:
+        model (eqx.Module): Model to cast.
+        dtype (jnp.dtype): Target dtype, e.g. jnp.bfloat16.
+
+    Returns:
+        model (eqx.Module): Model with its MLPs cast to `dtype`.
+    """
+
+    def cast(node):
+        if isinstance(node, MLP):
+            return jax.tree_util.tree_map(
+                lambda leaf: leaf.astype(dtype) if eqx.is_inexact_array(leaf) else leaf,
+                node,
+            )
+        return node
+
+    return jax.tree_util.tree_map(cast, model, is_leaf=lambda node: isinstance(node, MLP))
 
 
 def make_training_loop(
     optim: optax.GradientTransformation,
+    compute_dtype: Optional[jnp.dtype] = None,
 ) -> tuple[Callable, Callable, Callable]:
     """
     Create a function that trains an NF model.
@@ -16,6 +42,9 @@ def make_training_loop(
     Args:
         model (eqx.Model): NF model to train.
         optim (optax.GradientTransformation): Optimizer.
+        compute_dtype (jnp.dtype, optional): Dtype of the MLPs in the forward and backward pass,
+            e.g. jnp.bfloat16 for mixed precision training. The parameters, the optimizer state
+            and the loss stay in their original precision. Defaults to None (no casting).
 
     Returns:
         train_flow: Function that trains the model.
@@ -23,6 +52,8 @@ def make_training_loop(
 
     @eqx.filter_value_and_grad
     def loss_fn(model, x):
+        if compute_dtype is not None:
+            model = cast_mlp(model, compute_dtype)
         return -jnp.mean(model.log_prob(x))
 
     @eqx.filter_jit
@@ -121,3 +152,28 @@ def make_training_loop(
         return rng, best_model, state, loss_values
 
     return train_flow, train_epoch, train_step
+
+
+@jax.jit
+def mean_and_cov(
+    x: Float[Array, "n_example n_dim"]
+) -> Tuple[Float[Array, " n_dim"], Float[Array, "n_dim n_dim"]]:
+    """Compute the sample mean and covariance together.
+
+    The covariance is computed from one sum of outer products (a single `x.T @ x`).
+    The data is shifted by its first example beforehand to limit cancellation
+    when the mean is large compared to the spread.
+
+    Args:
+        x (Array): Data, shape (n_example, n_dim).
+
+    Returns:
+        mean (Array): Sample mean, shape (n_dim,).
+        cov (Array): Unbiased sample covariance, shape (n_dim, n_dim).
+    """
+    n = x.shape[0]
+    shift = x[0]
+    x = x - shift
+    mean = x.sum(axis=0) / n
+    cov = (x.T @ x) / n - jnp.outer(mean, mean)
+    return mean + shift, cov * n / (n - 1)
@@ -172,8 +172,9 @@ class HMC(ProposalBase):
         Float[Array, "n_chains n_steps 1"],
         Int[Array, "n_chains n_steps 1"],
     ]:
-        keys = jax.vmap(jax.random.split)(rng_key)
-        rng_key = keys[:, 0]
+        if verbose is False:
+            return self.sample_vmap(rng_key, n_steps, initial_position, data)
+
         logp = self.logpdf_vmap(initial_position, data)
         n_chains = rng_key.shape[0]
         acceptance = jnp.zeros((n_chains, n_steps))
@@ -198,16 +199,11 @@ class HMC(ProposalBase):
         )
         state = (rng_key, all_positions, all_logp, acceptance, data)
 
-        if verbose:
-            iterator_loop = tqdm(
-                range(1, n_steps),
-                desc="Sampling Locally",
-                miniters=int(n_steps / 10),
-            )
-        else:
-            iterator_loop = range(1, n_steps)
-
-        for i in iterator_loop:
+        for i in tqdm(
+            range(1, n_steps),
+            desc="Sampling Locally",
+            miniters=int(n_steps / 10),
+        ):
             state = self.update_vmap(i, state)
 
         state = (state[0], state[1], state[2], state[3])
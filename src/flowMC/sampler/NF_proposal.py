@@ -1,5 +1,6 @@
 import jax
 import jax.numpy as jnp
+import equinox as eqx
 from jax import random
 from tqdm import tqdm
 from flowMC.nfmodel.base import NFModel
@@ -14,14 +15,21 @@ class NFProposal(ProposalBase):
     model: NFModel
 
     def __init__(
-        self, logpdf: Callable, jit: bool, model: NFModel, n_flow_sample: int = 10000
+        self,
+        logpdf: Callable,
+        jit: bool,
+        model: NFModel,
+        n_flow_sample: int = 10000,
+        logpdf_vmap: Callable | None = None,
     ):
-        super().__init__(logpdf, jit)
+        super().__init__(logpdf, jit, logpdf_vmap=logpdf_vmap)
         self.model = model
         self.n_flow_sample = n_flow_sample
         self.update_vmap = jax.vmap(self.update, in_axes=(None, (0)))
         if self.jit is True:
             self.update_vmap = jax.jit(self.update_vmap)
+            # n_steps is a Python int, so it is static and each size compiles once.
+            self._sample_flow = eqx.filter_jit(self._sample_flow)
 
     def kernel(
         self,
@@ -123,51 +131,76 @@ class NFProposal(ProposalBase):
 
         n_chains = initial_position.shape[0]
         n_dim = initial_position.shape[-1]
-        log_prob_initial = self.logpdf_vmap(initial_position, data)[:, None]
-        log_prob_nf_initial = self.model.log_prob(initial_position)[:, None]
+        log_prob_initial = self.logpdf_vmap(initial_position, data)
+        log_prob_nf_initial = self.model.log_prob(initial_position)
 
         proposal_position, log_prob_proposal, log_prob_nf_proposal = self.sample_flow(
             subkeys[0], initial_position, data, n_steps
         )
+        chain_keys = jax.random.split(subkeys[1], n_chains)
 
-        state = (
-            jax.random.split(subkeys[1], n_chains),
-            jnp.zeros((n_chains, n_steps, n_dim)) + initial_position[:, None],
-            proposal_position,
-            jnp.zeros(
-                (
-                    n_chains,
-                    n_steps,
-                )
-            )
-            + log_prob_initial,
-            log_prob_proposal,
-            jnp.zeros(
-                (
-                    n_chains,
-                    n_steps,
-                )
-            )
-            + log_prob_nf_initial,
-            log_prob_nf_proposal,
-            jnp.zeros(
-                (
-                    n_chains,
-                    n_steps,
-                )
-            ),
-        )
         if verbose:
-            iterator_loop = tqdm(
+            state = (
+                chain_keys,
+                jnp.zeros((n_chains, n_steps, n_dim)) + initial_position[:, None],
+                proposal_position,
+                jnp.zeros((n_chains, n_steps)) + log_prob_initial[:, None],
+                log_prob_proposal,
+                jnp.zeros((n_chains, n_steps)) + log_prob_nf_initial[:, None],
+                log_prob_nf_proposal,
+                jnp.zeros((n_chains, n_steps)),
+            )
+            for i in tqdm(
                 range(1, n_steps),
                 desc="Sampling Globally",
                 miniters=int(n_steps / 10),
+            ):
+                state = self.update_vmap(i, state)
+            return (rng_key, state[1], state[3], state[7])
+
+        def step(carry, proposal_step):
+            position, log_prob, log_prob_nf = carry
+            key, proposal, log_prob_proposal, log_prob_nf_proposal = proposal_step
+            position, log_prob, log_prob_nf, do_accept = self.kernel(
+                key,
+                position,
+                proposal,
+                log_prob,
+                log_prob_proposal,
+                log_prob_nf,
+                log_prob_nf_proposal,
             )
-        else:
-            iterator_loop = range(1, n_steps)
-        for i in iterator_loop:
-            state = self.update_vmap(i, state)
-        return (rng_key, state[1], state[3], state[7])
+            return (position, log_prob, log_prob_nf), (position, log_prob, do_accept)
+
+        def sample_chain(
+            key, position, log_prob, log_prob_nf, proposal, log_prob_proposal, log_prob_nf_proposal
+        ):
+            # The first proposal is never used, the chain starts at the initial position.
+            _, (positions, log_probs, acceptance) = jax.lax.scan(
+                step,
+                (position, log_prob, log_prob_nf),
+                (
+                    jax.random.split(key, n_steps - 1),
+                    proposal[1:],
+                    log_prob_proposal[1:],
+                    log_prob_nf_proposal[1:],
+                ),
+            )
+            positions = jnp.concatenate([position[None], positions])
+            log_probs = jnp.concatenate([log_prob[None], log_probs])
+            acceptance = jnp.concatenate([jnp.zeros((1,)), acceptance])
+            return positions, log_probs, acceptance
+
+        positions, log_prob, acceptance = jax.vmap(sample_chain)(
+            chain_keys,
+            initial_position,
+            log_prob_initial,
+            log_prob_nf_initial,
+            proposal_position,
+            log_prob_proposal,
+            log_prob_nf_proposal,
+        )
+        return (rng_key, positions, log_prob, acceptance)
 
     def sample_flow(
         self,
@@ -176,38 +209,52 @@ class NFProposal(ProposalBase):
         data,
         n_steps: int,
     ):
+        return self._sample_flow(self.model, rng_key, initial_position, data, n_steps)
+
+    def _sample_flow(
+        self,
+        model: NFModel,
+        rng_key: PRNGKeyArray,
+        initial_position: Float[Array, "n_chains  n_dim"],
+        data,
+        n_steps: int,
+    ):
+        """
+        Draw the proposals of `n_steps` global steps from `model`.
+        The model is an argument so the jitted version picks up a retrained model.
+        """
         n_chains = initial_position.shape[0]
         n_dim = initial_position.shape[-1]
         total_size = initial_position.shape[0] * n_steps
         if total_size > self.n_flow_sample:
-            rng_key = rng_key
             n_batch = ceil(total_size / self.n_flow_sample)
-            n_sample = total_size // n_batch
-            proposal_position = jnp.zeros(
-                (n_batch, n_sample, initial_position.shape[-1])
-            )
-            log_prob_proposal = jnp.zeros((n_batch, n_sample))
-            log_prob_nf_proposal = jnp.zeros((n_batch, n_sample))
+            n_sample = ceil(total_size / n_batch)
+            # Write every batch into flat buffers covering all the batches,
+            # the last batch may run past total_size.
+            proposal_position = jnp.zeros((n_batch * n_sample, n_dim))
+            log_prob_proposal = jnp.zeros((n_batch * n_sample,))
+            log_prob_nf_proposal = jnp.zeros((n_batch * n_sample,))
             for i in range(n_batch):
                 rng_key, subkey = random.split(rng_key)
-                proposal_position = proposal_position.at[i].set(
-                    self.model.sample(subkey, n_sample)
+                samples = model.sample(subkey, n_sample)
+                proposal_position = jax.lax.dynamic_update_slice(
+                    proposal_position, samples, (i * n_sample, 0)
                 )
-                log_prob_proposal = log_prob_proposal.at[i].set(
-                    self.logpdf_vmap(proposal_position[i], data)
+                log_prob_proposal = jax.lax.dynamic_update_slice(
+                    log_prob_proposal, self.logpdf_vmap(samples, data), (i * n_sample,)
                 )
-                log_prob_nf_proposal = log_prob_nf_proposal.at[i].set(
-                    self.model.log_prob(proposal_position[i])
+                log_prob_nf_proposal = jax.lax.dynamic_update_slice(
+                    log_prob_nf_proposal, model.log_prob(samples), (i * n_sample,)
                 )
 
-            proposal_position = proposal_position.reshape(-1, n_dim)[:total_size]
-            log_prob_proposal = log_prob_proposal.reshape(-1)[:total_size]
-            log_prob_nf_proposal = log_prob_nf_proposal.reshape(-1)[:total_size]
+            proposal_position = proposal_position[:total_size]
+            log_prob_proposal = log_prob_proposal[:total_size]
+            log_prob_nf_proposal = log_prob_nf_proposal[:total_size]
 
         else:
-            proposal_position = self.model.sample(rng_key, total_size)
+            proposal_position = model.sample(rng_key, total_size)
             log_prob_proposal = self.logpdf_vmap(proposal_position, data)
-            log_prob_nf_proposal = self.model.log_prob(proposal_position)
+            log_prob_nf_proposal = model.log_prob(proposal_position)
 
         proposal_position = proposal_position.reshape(n_chains, n_steps, n_dim)
         log_prob_proposal = log_prob_proposal.reshape(n_chains, n_steps)
@@ -11,82 +11,64 @@ class ProposalBase:
         self,
         logpdf: Callable[[Float[Array, " n_dim"], PyTree], Float],
         jit: bool,
+        logpdf_vmap: Callable | None = None,
         **kwargs,
     ):
         """
-        Initialize the sampler class
+        Initialize the sampler class.
+        If `logpdf_vmap` is given, e.g. the one of another sampler of the same logpdf,
+        it is used as is rather than building a new one.
         """
         self.logpdf = logpdf
         self.jit = jit
-        self.logpdf_vmap = jax.vmap(logpdf, in_axes=(0, None))
+        self.logpdf_vmap = logpdf_vmap
+        if logpdf_vmap is None:
+            self.logpdf_vmap = jax.vmap(logpdf, in_axes=(0, None))
         self.kernel_vmap = jax.vmap(self.kernel, in_axes=(0, 0, 0, None))
         self.update_vmap = jax.vmap(
             self.update,
             in_axes=(None, (0, 0, 0, 0, None)),
             out_axes=(0, 0, 0, 0, None),
         )
+        self.sample_vmap = jax.vmap(self.sample_chain, in_axes=(0, None, 0, None))
         self.kwargs = kwargs
         if self.jit is True:
-            self.logpdf_vmap = jax.jit(self.logpdf_vmap)
+            if logpdf_vmap is None:
+                self.logpdf_vmap = jax.jit(self.logpdf_vmap)
             self.kernel = jax.jit(self.kernel)
             self.kernel_vmap = jax.jit(self.kernel_vmap)
             self.update = jax.jit(self.update)
             self.update_vmap = jax.jit(self.update_vmap)
+            self.sample_vmap = jax.jit(self.sample_vmap, static_argnums=(1,))
 
     def precompilation(self, n_chains, n_dims, n_step, data):
+        """
+        Warm up the kernels by calling them once on dummy inputs.
+        The kernels stay traceable so they can be fused into the sampling scan.
+        """
         if self.jit is True:
             print("jit is requested, precompiling kernels and update...")
-            key = jax.random.split(jax.random.PRNGKey(0), n_chains)
-
-            self.logpdf_vmap = (
-                jax.jit(self.logpdf_vmap)
-                .lower(jnp.ones((n_chains, n_dims)), data)
-                .compile()
-            )
-            self.kernel_vmap = (
-                jax.jit(self.kernel_vmap)
-                .lower(
-                    key,
-                    jnp.ones((n_chains, n_dims)),
-                    jnp.ones((n_chains, )),
-                    data,
-                )
-                .compile()
-            )
-            self.update_vmap = (
-                jax.jit(self.update_vmap)
-                .lower(
-                    1,
-                    (
-                        key,
-                        jnp.ones((n_chains, n_step, n_dims)),
-                        jnp.ones((n_chains, n_step, )),
-                        jnp.zeros((n_chains, n_step, )),
-                        data,
-                    ),
-                )
-                .compile()
-            )
         else:
             print("jit is not requested, compiling only vmap functions...")
-            key = jax.random.split(jax.random.PRNGKey(0), n_chains)
-            self.logpdf_vmap = self.logpdf_vmap(jnp.ones((n_chains, n_dims)), data)
-            self.kernel_vmap(
+        key = jax.random.split(jax.random.PRNGKey(0), n_chains)
+        self.logpdf_vmap(jnp.ones((n_chains, n_dims)), data)
+        self.kernel_vmap(
+            key,
+            jnp.ones((n_chains, n_dims)),
+            jnp.ones((n_chains, )),
+            data,
+        )
+        self.update_vmap(
+            1,
+            (
                 key,
-                jnp.ones((n_chains, n_dims)),
-                jnp.ones((n_chains, )),
+                jnp.ones((n_chains, n_step, n_dims)),
+                jnp.ones((n_chains, n_step, )),
+                jnp.zeros((n_chains, n_step, )),
                 data,
-            )
-            self.update_vmap(
-                1,
-                (
-                    key,
-                    jnp.ones((n_chains, n_step, n_dims)),
-                    jnp.ones((n_chains, n_step, )),
-                    jnp.zeros((n_chains, n_step, )),
-                    data,
-                ),
-            )
+            ),
+        )
+        self.sample_vmap(key, n_step, jnp.ones((n_chains, n_dims)), data)
 
     @abstractmethod
     def kernel(
@@ -124,6 +106,41 @@ class ProposalBase:
         Make the update function for multiple steps
         """
 
+    def sample_chain(
+        self,
+        rng_key: PRNGKeyArray,
+        n_steps: int,
+        initial_position: Float[Array, " n_dim"],
+        data: PyTree,
+    ) -> tuple[
+        PRNGKeyArray,
+        Float[Array, "n_steps  n_dim"],
+        Float[Array, "n_steps 1"],
+        Int[Array, "n_steps 1"],
+    ]:
+        """
+        Sample a single chain by scanning the kernel over one key per step.
+        The first step is the initial position.
+        This is vmapped over chains in `sample_vmap`.
+        """
+
+        def step(carry, key):
+            position, log_prob = carry
+            position, log_prob, do_accept = self.kernel(key, position, log_prob, data)
+            return (position, log_prob), (position, log_prob, do_accept)
+
+        rng_key, subkey = jax.random.split(rng_key)
+        log_prob = self.logpdf(initial_position, data)
+        _, (positions, log_probs, acceptance) = jax.lax.scan(
+            step,
+            (initial_position, log_prob),
+            jax.random.split(subkey, n_steps - 1),
+        )
+        positions = jnp.concatenate([initial_position[None], positions])
+        log_probs = jnp.concatenate([log_prob[None], log_probs])
+        acceptance = jnp.concatenate([jnp.zeros((1,)), acceptance])
+        return rng_key, positions, log_probs, acceptance
+
     @abstractmethod
     def sample(
         self,
@@ -1,8 +1,10 @@
 import pickle
 import jax
 import jax.numpy as jnp
+import numpy as np
+from jax.sharding import Mesh, NamedSharding, PartitionSpec
 from jaxtyping import Array, Int, Float, PRNGKeyArray
-from flowMC.nfmodel.utils import make_training_loop
+from flowMC.nfmodel.utils import make_training_loop, mean_and_cov
 from flowMC.sampler.NF_proposal import NFProposal
 import optax
 from flowMC.sampler.Proposal_Base import ProposalBase
@@ -10,6 +12,9 @@ from flowMC.nfmodel.base import NFModel
 from tqdm import tqdm
 import equinox as eqx
 
+# Donate the buffer so the summary is written in place instead of being copied.
+_update_slice = jax.jit(jax.lax.dynamic_update_slice, donate_argnums=(0,))
+
 
 class Sampler:
     """
@@ -30,6 +35,8 @@ class Sampler:
         n_loop_production (int): Number of production loops.
         train_thinning (int): Thinning parameter for training.
         output_thinning (int): Thinning parameter for sampling.
+        keep_quantile (float): Fraction of the chains with the lowest log_prob left out of the training data.
+        chain_method (str): How the local sampler runs the chains, "vectorized" (vmap) or "sequential" (lax.map).
 
         use_global (bool): Whether to use the global sampler.
         batch_size (int): Batch size for training.
@@ -38,9 +45,11 @@ class Sampler:
         momentum (float): Momentum of the optimizer.
         n_max_examples (int): Maximum number of examples per training step.
         n_flow_sample (int): Number of samples to generate from the normalizing flow.
+        train_dtype (jnp.dtype): Dtype of the normalizing flow network during training, e.g. jnp.bfloat16.
+        accum_steps (int): Number of batches whose gradients are accumulated per optimizer update, at most n_max_examples // batch_size.
 
         precompile (bool): Whether to precompile the local sampler.
-        verbose (bool): Whether to print verbose output.
+        verbose (bool): Whether to print verbose output. This steps through the samplers one step at a time.
         logging (bool): Whether to log the output.
         outdir (str): Output directory.
     """
@@ -60,6 +69,8 @@ class Sampler:
     n_loop_production: int = 3
     train_thinning: int = 1
     output_thinning: int = 1
+    keep_quantile: float = 0.0
+    chain_method: str = "vectorized"
     local_autotune: bool = False
 
     # Normalizing flow hyperparameters
@@ -71,6 +82,8 @@ class Sampler:
     momentum: float = 0.9
     n_max_examples: int = 10000
     n_flow_sample: int = 10000
+    train_dtype: jnp.dtype | None = None
+    accum_steps: int = 1
 
     # Logging hyperparameters
     precompile: bool = False
@@ -82,6 +95,15 @@ class Sampler:
     def nf_model(self):
         return self._global_sampler.model
 
+    @property
+    def summary(self) -> dict[str, dict[str, Array]]:
+        """
+        The training and production sets sampled so far.
+        The preallocated buffers behind them are private,
+        since they are donated to the jitted calls that write them.
+        """
+        return {mode: self._filled_summary(mode) for mode in self._summary}
+
     def __init__(
         self,
         n_dim: int,
@@ -94,7 +116,7 @@ class Sampler:
         # Copying input into the model
 
         self.n_dim = n_dim
-        self.rng_key = rng_key
+        self.rng_key = jax.device_put(rng_key)
         self.data = data
         self.local_sampler = local_sampler
         self.model = nf_model
@@ -106,7 +128,17 @@ class Sampler:
                 if not key.startswith("__"):
                     setattr(self, key, value)
 
-        self.variables: dict[str, Float] = {"mean": jnp.nan, "var": jnp.nan}
+        if self.chain_method not in ["vectorized", "sequential"]:
+            raise ValueError(f"Unknown chain_method {self.chain_method}")
+        # The flow is trained on n_max_examples samples per epoch.
+        n_batches = max(self.n_max_examples // self.batch_size, 1)
+        if self.accum_steps > n_batches:
+            raise ValueError(
+                f"accum_steps {self.accum_steps} is larger than the {n_batches} batches"
+                " of an epoch, lower it or the batch_size"
+            )
+
+        self.variables: dict[str, Float] = {"mean": jnp.nan, "cov": jnp.nan}
 
         # Initialized local and global samplers
 
@@ -119,36 +151,40 @@ class Sampler:
                 data=data,
             )
 
-        self._global_sampler = NFProposal(
-            self.local_sampler.logpdf,
-            jit=self.local_sampler.jit,
-            model=nf_model,
-            n_flow_sample=self.n_flow_sample,
-        )
-
         self.likelihood_vec = self.local_sampler.logpdf_vmap
+        self._global_sampler = self._make_global_sampler(
+            nf_model, jit=self.local_sampler.jit
+        )
+        # Spread the chains over the local devices when they split evenly.
+        # Sequential chains are walked one at a time, so they are not split.
+        self._chain_sharding = None
+        n_devices = jax.local_device_count()
+        if (
+            self.chain_method == "vectorized"
+            and n_devices > 1
+            and self.n_chains % n_devices == 0
+        ):
+            self._chain_sharding = NamedSharding(
+                Mesh(np.array(jax.local_devices()), ("chains",)),
+                PartitionSpec("chains"),
+            )
+        if self.local_sampler.jit is True:
+            self._local_step = eqx.filter_jit(self._local_step)
+            self._global_step = eqx.filter_jit(self._global_step)
+            self._production_scan = eqx.filter_jit(
+                self._production_scan, donate="all-except-first"
+            )
 
         tx = optax.chain(optax.clip(1.0), optax.adam(self.learning_rate, self.momentum))
-        self.optim_state = tx.init(eqx.filter(self.nf_model, eqx.is_array))
-        self.nf_training_loop, train_epoch, train_step = make_training_loop(tx)
+        if self.accum_steps > 1:
+            tx = optax.MultiSteps(tx, every_k_schedule=self.accum_steps)
+        self.optim_state = tx.init(eqx.filter(self.nf_model, eqx.is_inexact_array))
+        self.nf_training_loop, train_epoch, train_step = make_training_loop(
+            tx, compute_dtype=self.train_dtype
+        )
 
         # Initialized result dictionary
-        training = {}
-        training["chains"] = jnp.empty((self.n_chains, 0, self.n_dim))
-        training["log_prob"] = jnp.empty((self.n_chains, 0))
-        training["local_accs"] = jnp.empty((self.n_chains, 0))
-        training["global_accs"] = jnp.empty((self.n_chains, 0))
-        training["loss_vals"] = jnp.empty((0, self.n_epochs))
-
-        production = {}
-        production["chains"] = jnp.empty((self.n_chains, 0, self.n_dim))
-        production["log_prob"] = jnp.empty((self.n_chains, 0))
-        production["local_accs"] = jnp.empty((self.n_chains, 0))
-        production["global_accs"] = jnp.empty((self.n_chains, 0))
-
-        self.summary = {}
-        self.summary["training"] = training
-        self.summary["production"] = production
+        self.reset()
 
     def sample(self, initial_position: Float[Array, "n_chains n_dim"], data: dict):
         """
@@ -169,7 +205,10 @@ class Sampler:
         # as the actual sampling loop to avoid recompilation.
 
 
-        initial_position = jnp.atleast_2d(initial_position)
+        # Move the inputs to the device once, instead of on every jitted call,
+        # e.g. when the data is given as numpy arrays.
+        initial_position = jnp.atleast_2d(jax.device_put(initial_position))
+        data = jax.device_put(data)
         self.local_sampler_tuning(initial_position, data)
         last_step = initial_position
         if self.use_global is True:
@@ -182,6 +221,7 @@ class Sampler:
         initial_position: Float[Array, "n_chains n_dim"],
         data: dict,
         training=False,
+        rng_keys: PRNGKeyArray | None = None,
     ) -> Float[Array, "n_chains n_dim"]:
         """
         One sampling loop that iterate through the local sampler
@@ -192,6 +232,8 @@ class Sampler:
             initial_position (jnp.array): Initial position. Shape (n_chains, n_dim)
             training (bool, optional):
             Whether to train the normalizing flow model. Defaults to False.
+            rng_keys (PRNGKeyArray, optional):
+            Keys of this loop, as returned by `_split_loop_keys`. Split from `rng_key` if not given.
 
         Returns:
             chains (jnp.array):
@@ -202,52 +244,58 @@ class Sampler:
             summary_mode = "training"
         else:
             summary_mode = "production"
-
-        self.rng_key, rng_keys_mcmc = jax.random.split(self.rng_key)
-        rng_keys_mcmc = jax.random.split(rng_keys_mcmc, self.n_chains)
-        (
-            rng_keys_mcmc,
-            positions,
-            log_prob,
-            local_acceptance,
-        ) = self.local_sampler.sample(
-            rng_keys_mcmc,
-            self.n_local_steps,
-            initial_position,
-            data,
-            verbose=self.verbose,
+        self._reserve_summary(summary_mode, 1)
+        if rng_keys is None:
+            rng_keys = self._split_loop_keys(1)[0]
+        rng_keys_mcmc, rng_keys_nf = rng_keys[: self.n_chains], rng_keys[-1]
+        rng_keys_mcmc, initial_position = self._shard_chains(
+            rng_keys_mcmc, initial_position
         )
 
-        self.summary[summary_mode]["chains"] = jnp.append(
-            self.summary[summary_mode]["chains"],
-            positions[:, :: self.output_thinning],
-            axis=1,
+        if self.verbose is True:
+            # Step through the local sampler to show its progress.
+            _, positions, log_prob, local_acceptance = self.local_sampler.sample(
+                rng_keys_mcmc, self.n_local_steps, initial_position, data, verbose=True
+            )
+        else:
+            positions, log_prob, local_acceptance = self._local_step(
+                rng_keys_mcmc, initial_position, data
+            )
+
+        self._write_summary(
+            summary_mode, "chains", positions[:, :: self.output_thinning]
         )
-        self.summary[summary_mode]["log_prob"] = jnp.append(
-            self.summary[summary_mode]["log_prob"],
-            log_prob[:, :: self.output_thinning],
-            axis=1,
+        self._write_summary(
+            summary_mode, "log_prob", log_prob[:, :: self.output_thinning]
         )
-
-        self.summary[summary_mode]["local_accs"] = jnp.append(
-            self.summary[summary_mode]["local_accs"],
-            local_acceptance[:, 1 :: self.output_thinning],
-            axis=1,
+        self._write_summary(
+            summary_mode, "local_accs", local_acceptance[:, 1 :: self.output_thinning]
         )
 
         if self.use_global is True:
-            self.rng_key, rng_keys_nf = jax.random.split(self.rng_key)
             if training is True:
-                positions = self.summary["training"]["chains"][
-                    :, :: self.train_thinning
+                training_chains = self._summary["training"]["chains"][
+                    :, : self._write_offset["training"]["chains"] : self.train_thinning
                 ]
-                chain_size = positions.shape[0] * positions.shape[1]
+                if self.keep_quantile > 0:
+                    # Only train on the chains that reached the highest log_prob.
+                    # top_k keeps the number of selected chains static.
+                    max_log_prob = jnp.max(
+                        self._summary["training"]["log_prob"][
+                            :, : self._write_offset["training"]["log_prob"]
+                        ],
+                        axis=1,
+                    )
+                    n_keep = max(int(self.n_chains * (1 - self.keep_quantile)), 1)
+                    _, index = jax.lax.top_k(max_log_prob, n_keep)
+                    training_chains = training_chains[index]
+                chain_size = training_chains.shape[0] * training_chains.shape[1]
                 if chain_size > self.n_max_examples:
-                    flat_chain = positions[
-                        :, -int(self.n_max_examples / self.n_chains) :
+                    flat_chain = training_chains[
+                        :, -int(self.n_max_examples / training_chains.shape[0]) :
                     ].reshape(-1, self.n_dim)
                 else:
-                    flat_chain = positions.reshape(-1, self.n_dim)
+                    flat_chain = training_chains.reshape(-1, self.n_dim)
 
                 if flat_chain.shape[0] < self.n_max_examples:
                     # This is to pad the training data to avoid recompilation.
@@ -258,13 +306,12 @@ class Sampler:
                     )
                     flat_chain = flat_chain[: self.n_max_examples]
 
-                self.variables["mean"] = jnp.mean(flat_chain, axis=0)
-                self.variables["cov"] = jnp.cov(flat_chain.T)
+                self.variables["mean"], self.variables["cov"] = mean_and_cov(flat_chain)
+                # Swap both statistics in a single walk over the model.
                 self._global_sampler.model = eqx.tree_at(
-                    lambda m: m._data_mean, self.nf_model, self.variables["mean"]
-                )
-                self._global_sampler.model = eqx.tree_at(
-                    lambda m: m._data_cov, self.nf_model, self.variables["cov"]
+                    lambda m: (m._data_mean, m._data_cov),
+                    self.nf_model,
+                    (self.variables["mean"], self.variables["cov"]),
                 )
 
 
@@ -282,44 +329,32 @@ class Sampler:
                     self.batch_size,
                     self.verbose,
                 )
-                self.summary["training"]["loss_vals"] = jnp.append(
-                    self.summary["training"]["loss_vals"],
-                    loss_values.reshape(1, -1),
-                    axis=0,
-                )
+                self._write_summary("training", "loss_vals", loss_values.reshape(1, -1))
 
-            (
-                rng_keys_nf,
-                nf_chain,
-                log_prob,
-                global_acceptance,
-            ) = self._global_sampler.sample(
-                rng_keys_nf,
-                self.n_global_steps,
-                positions[:, -1],
-                data,
-                verbose=self.verbose,
-                mode=summary_mode,
-            )
+            if self.verbose is True:
+                _, nf_chain, log_prob, global_acceptance = self._global_sampler.sample(
+                    rng_keys_nf, self.n_global_steps, positions[:, -1], data, verbose=True
+                )
+            else:
+                nf_chain, log_prob, global_acceptance = self._global_step(
+                    self.nf_model, rng_keys_nf, positions[:, -1], data
+                )
 
-            self.summary[summary_mode]["chains"] = jnp.append(
-                self.summary[summary_mode]["chains"],
-                nf_chain[:, :: self.output_thinning],
-                axis=1,
+            self._write_summary(
+                summary_mode, "chains", nf_chain[:, :: self.output_thinning]
             )
-            self.summary[summary_mode]["log_prob"] = jnp.append(
-                self.summary[summary_mode]["log_prob"],
-                log_prob[:, :: self.output_thinning],
-                axis=1,
+            self._write_summary(
+                summary_mode, "log_prob", log_prob[:, :: self.output_thinning]
             )
-
-            self.summary[summary_mode]["global_accs"] = jnp.append(
-                self.summary[summary_mode]["global_accs"],
+            self._write_summary(
+                summary_mode,
+                "global_accs",
                 global_acceptance[:, 1 :: self.output_thinning],
-                axis=1,
             )
 
-        last_step = self.summary[summary_mode]["chains"][:, -1]
+        last_step = self._summary[summary_mode]["chains"][
+            :, self._write_offset[summary_mode]["chains"] - 1
+        ]
 
         return last_step
 
@@ -367,12 +402,16 @@ class Sampler:
 
         """
         print("Training normalizing flow")
+        self._reserve_summary("training", self.n_loop_training)
+        loop_keys = self._split_loop_keys(self.n_loop_training)
         last_step = initial_position
-        for _ in tqdm(
+        for i in tqdm(
             range(self.n_loop_training),
             desc="Tuning global sampler",
         ):
-            last_step = self.sampling_loop(last_step, data, training=True)
+            last_step = self.sampling_loop(
+                last_step, data, training=True, rng_keys=loop_keys[i]
+            )
         return last_step
 
     def production_run(
@@ -389,14 +428,251 @@ class Sampler:
 
         """
         print("Starting Production run")
-        last_step = initial_position
-        for _ in tqdm(
-            range(self.n_loop_production),
-            desc="Production run",
-        ):
-            last_step = self.sampling_loop(last_step, data)
+
+        if self.verbose is True:
+            # Run the loops one by one so the samplers can show their progress.
+            loop_keys = self._split_loop_keys(self.n_loop_production)
+            last_step = initial_position
+            for i in tqdm(range(self.n_loop_production), desc="Production run"):
+                last_step = self.sampling_loop(last_step, data, rng_keys=loop_keys[i])
+            return last_step
+
+        self._reserve_summary("production", self.n_loop_production)
+        offsets = self._write_offset["production"]
+        # Only the buffers the loops write to are donated, see `_filled_summary`.
+        keys = [key for key in offsets if self._summary_shape(key, 1)[1] > 0]
+        # The loop keys are not sharded. They hold n_chains + 1 keys per loop,
+        # which does not split evenly, and are a few bytes per chain, so copying
+        # them to every device costs next to nothing.
+        last_step, summary = self._production_scan(
+            (self.nf_model, self._shard_chains(initial_position), data),
+            {key: self._summary["production"][key] for key in keys},
+            {key: jnp.asarray(offsets[key]) for key in keys},
+            self._split_loop_keys(self.n_loop_production),
+        )
+        # The scan sorts the keys of the summary, keep the order set in `reset`.
+        self._summary["production"] = {
+            key: summary.get(key, buffer)
+            for key, buffer in self._summary["production"].items()
+        }
+        for key in keys:
+            offsets[key] += self._summary_shape(key, self.n_loop_production)[1]
         return last_step
 
+    def _production_scan(
+        self,
+        inputs: tuple[NFModel, Float[Array, "n_chains n_dim"], dict],
+        summary: dict[str, Array],
+        offsets: dict[str, Int],
+        rng_keys: PRNGKeyArray,
+    ) -> tuple[Float[Array, "n_chains n_dim"], dict[str, Array]]:
+        """
+        Run all the production loops in a single `jax.lax.scan`.
+        Each loop is written straight into the summary buffers carried by the scan,
+        instead of stacking the loops and reshaping them to (n_chains, n_step, ...).
+        When jitted, every argument but `inputs` is donated, so the buffers are updated in place.
+
+        Args:
+            inputs (tuple): Normalizing flow model, initial position and data.
+            summary (dict): Production summary buffers.
+            offsets (dict): Offsets at which the first loop is written.
+            rng_keys (PRNGKeyArray): Keys of the loops, as returned by `_split_loop_keys`.
+
+        Returns:
+            last_step (Device Array): Last position of the chains, shape (n_chains, n_dim)
+            summary (dict): Updated production summary buffers.
+        """
+        model, initial_position, data = inputs
+
+        def _production_step(carry, loop):
+            last_step, summary = carry
+            i, rng_keys = loop
+            outputs = self._sampling_step(model, rng_keys, last_step, data)
+            for key in summary:
+                value = outputs[key]
+                start_indices = [0] * value.ndim
+                start_indices[1] = offsets[key] + i * value.shape[1]
+                summary[key] = jax.lax.dynamic_update_slice(
+                    summary[key], value.astype(summary[key].dtype), start_indices
+                )
+            return (outputs["chains"][:, -1], summary), None
+
+        (last_step, summary), _ = jax.lax.scan(
+            _production_step,
+            (initial_position, summary),
+            (jnp.arange(rng_keys.shape[0]), rng_keys),
+        )
+        return last_step, summary
+
+    def _local_step(
+        self,
+        rng_keys_mcmc: PRNGKeyArray,
+        initial_position: Float[Array, "n_chains n_dim"],
+        data: dict,
+    ) -> tuple[
+        Float[Array, "n_chains n_local_steps n_dim"],
+        Float[Array, "n_chains n_local_steps"],
+        Float[Array, "n_chains n_local_steps"],
+    ]:
+        """
+        Run the local sampler on all chains. Jitted in `__init__` if requested.
+
+        Args:
+            rng_keys_mcmc (PRNGKeyArray): Jax PRNGKeys, one per chain.
+            initial_position (Device Array): Initial position, shape (n_chains, n_dim)
+            data (dict): Data to be passed to the logpdf function.
+
+        Returns:
+            positions (Device Array): Local chains, shape (n_chains, n_local_steps, n_dim)
+            log_prob (Device Array): Log probability of the local chains.
+            local_acceptance (Device Array): Local acceptance of each step.
+        """
+        if self.chain_method == "sequential":
+            # One chain at a time, which lowers the peak memory for many chains.
+            _, positions, log_prob, local_acceptance = jax.lax.map(
+                lambda chain: self.local_sampler.sample_chain(
+                    chain[0], self.n_local_steps, chain[1], data
+                ),
+                (rng_keys_mcmc, initial_position),
+            )
+        else:
+            _, positions, log_prob, local_acceptance = self.local_sampler.sample(
+                rng_keys_mcmc, self.n_local_steps, initial_position, data
+            )
+        return positions, log_prob, local_acceptance
+
+    def _global_step(
+        self,
+        model: NFModel,
+        rng_keys_nf: PRNGKeyArray,
+        initial_position: Float[Array, "n_chains n_dim"],
+        data: dict,
+    ) -> tuple[
+        Float[Array, "n_chains n_global_steps n_dim"],
+        Float[Array, "n_chains n_global_steps"],
+        Float[Array, "n_chains n_global_steps"],
+    ]:
+        """
+        Run the global sampler powered by `model` on all chains.
+        The flow is an explicit argument so this can be jitted once and reused
+        while the flow is being trained.
+
+        Args:
+            model (NFModel): Normalizing flow model used for the proposals.
+            rng_keys_nf (PRNGKeyArray): Jax PRNGKey.
+            initial_position (Device Array): Initial position, shape (n_chains, n_dim)
+            data (dict): Data to be passed to the logpdf function.
+
+        Returns:
+            nf_chain (Device Array): Global chains, shape (n_chains, n_global_steps, n_dim)
+            log_prob (Device Array): Log probability of the global chains.
+            global_acceptance (Device Array): Global acceptance of each step.
+        """
+        global_sampler = self._make_global_sampler(model, jit=False)
+        _, nf_chain, log_prob, global_acceptance = global_sampler.sample(
+            rng_keys_nf, self.n_global_steps, initial_position, data
+        )
+        return nf_chain, log_prob, global_acceptance
+
+    def _make_global_sampler(self, model: NFModel, jit: bool) -> NFProposal:
+        """
+        Build the global sampler around `model`.
+        It evaluates the target through the cached `likelihood_vec` of the local sampler
+        instead of vmapping (and jitting) the logpdf once more.
+
+        Args:
+            model (NFModel): Normalizing flow model used for the proposals.
+            jit (bool): Whether to jit the global sampler.
+
+        Returns:
+            global_sampler (NFProposal): Global sampler.
+        """
+        global_sampler = NFProposal(
+            self.local_sampler.logpdf,
+            jit=jit,
+            model=model,
+            n_flow_sample=self.n_flow_sample,
+            logpdf_vmap=self.likelihood_vec,
+        )
+        return global_sampler
+
+    def _sampling_step(
+        self,
+        model: NFModel,
+        rng_keys: PRNGKeyArray,
+        initial_position: Float[Array, "n_chains n_dim"],
+        data: dict,
+    ) -> dict[str, Array]:
+        """
+        One local-global sampling loop with a fixed normalizing flow,
+        written as a pure function so it can be driven by `jax.lax.scan`.
+
+        Args:
+            model (NFModel): Normalizing flow model used for the proposals.
+            rng_keys (PRNGKeyArray): Keys of this loop, as returned by `_split_loop_keys`.
+            initial_position (Device Array): Initial position, shape (n_chains, n_dim)
+            data (dict): Data to be passed to the logpdf function.
+
+        Returns:
+            outputs (dict): Thinned chains, log_prob, local_accs and global_accs of this loop.
+        """
+        rng_keys_mcmc, rng_keys_nf = rng_keys[: self.n_chains], rng_keys[-1]
+        positions, log_prob, local_acceptance = self._local_step(
+            rng_keys_mcmc, initial_position, data
+        )
+
+        outputs = {}
+        outputs["chains"] = positions[:, :: self.output_thinning]
+        outputs["log_prob"] = log_prob[:, :: self.output_thinning]
+        outputs["local_accs"] = local_acceptance[:, 1 :: self.output_thinning]
+        outputs["global_accs"] = jnp.empty((self.n_chains, 0))
+
+        if self.use_global is True:
+            nf_chain, log_prob, global_acceptance = self._global_step(
+                model, rng_keys_nf, positions[:, -1], data
+            )
+            outputs["chains"] = jnp.concatenate(
+                [outputs["chains"], nf_chain[:, :: self.output_thinning]], axis=1
+            )
+            outputs["log_prob"] = jnp.concatenate(
+                [outputs["log_prob"], log_prob[:, :: self.output_thinning]], axis=1
+            )
+            outputs["global_accs"] = global_acceptance[:, 1 :: self.output_thinning]
+
+        return outputs
+
+    def _shard_chains(self, *arrays: Array) -> Array | tuple[Array, ...]:
+        """
+        Split arrays with a leading chain axis evenly over the local devices,
+        so the jitted samplers they are passed to run the chains in parallel.
+        The arrays are returned unchanged on a single device.
+
+        Args:
+            arrays (Array): Arrays of shape (n_chains, ...).
+
+        Returns:
+            arrays (Array): The arrays, sharded along the chain axis.
+        """
+        if self._chain_sharding is not None:
+            arrays = tuple(jax.device_put(x, self._chain_sharding) for x in arrays)
+        return arrays[0] if len(arrays) == 1 else arrays
+
+    def _split_loop_keys(self, n_loop: int) -> PRNGKeyArray:
+        """
+        Split the keys of `n_loop` sampling loops from `rng_key` at once,
+        instead of splitting them again in every loop.
+
+        Args:
+            n_loop (int): Number of sampling loops.
+
+        Returns:
+            rng_keys (PRNGKeyArray): Keys of shape (n_loop, n_chains + 1, ...).
+            The first n_chains keys of a loop drive the local sampler, the last one the global sampler.
+        """
+        rng_keys = jax.random.split(self.rng_key, n_loop * (self.n_chains + 1) + 1)
+        self.rng_key = rng_keys[0]
+        return rng_keys[1:].reshape((n_loop, self.n_chains + 1) + rng_keys.shape[1:])
+
     def get_sampler_state(self, training: bool = False) -> dict:
         """
         Get the sampler state. There are two sets of sampler outputs one can get,
@@ -409,11 +685,14 @@ class Sampler:
         Args:
             training (bool): Whether to get the training set sampler state. Defaults to False.
 
+        Returns:
+            state (dict): Chains, log_prob, local_accs, global_accs and, for the training set, loss_vals.
+            The arrays stay valid when sampling continues.
         """
         if training is True:
-            return self.summary["training"]
+            return self._filled_summary("training")
         else:
-            return self.summary["production"]
+            return self._filled_summary("production")
 
     def sample_flow(self, rng_key: PRNGKeyArray, n_samples: int) -> Float[Array, "n_samples n_dim"]:
         """
@@ -463,24 +742,122 @@ class Sampler:
     def reset(self):
         """
         Reset the sampler state.
+        The summary is preallocated to hold one full training and production run,
+        and each loop writes its outputs in place.
+
+        """
+        n_loop_training = self.n_loop_training if self.use_global is True else 0
+        self._summary = {}
+        self._summary["training"] = {}
+        self._summary["production"] = {}
+        self._write_offset = {}
+        self._write_offset["training"] = {}
+        self._write_offset["production"] = {}
+        for key in ["chains", "log_prob", "local_accs", "global_accs", "loss_vals"]:
+            self._summary["training"][key] = jnp.zeros(
+                self._summary_shape(key, n_loop_training)
+            )
+            self._write_offset["training"][key] = 0
+            if key != "loss_vals":
+                self._summary["production"][key] = jnp.zeros(
+                    self._summary_shape(key, self.n_loop_production)
+                )
+                self._write_offset["production"][key] = 0
+
+    def _summary_shape(self, key: str, n_loop: int) -> tuple[int, ...]:
+        """
+        Shape of the summary entry `key` holding `n_loop` sampling loops.
 
+        Args:
+            key (str): Name of the summary entry.
+            n_loop (int): Number of sampling loops to hold.
         """
-        training = {}
-        training["chains"] = jnp.empty((self.n_chains, 0, self.n_dim))
-        training["log_prob"] = jnp.empty((self.n_chains, 0))
-        training["local_accs"] = jnp.empty((self.n_chains, 0))
-        training["global_accs"] = jnp.empty((self.n_chains, 0))
-        training["loss_vals"] = jnp.empty((0, self.n_epochs))
+        n_local = len(range(0, self.n_local_steps, self.output_thinning))
+        n_local_accs = len(range(1, self.n_local_steps, self.output_thinning))
+        n_global = 0
+        n_global_accs = 0
+        if self.use_global is True:
+            n_global = len(range(0, self.n_global_steps, self.output_thinning))
+            n_global_accs = len(range(1, self.n_global_steps, self.output_thinning))
+
+        if key == "chains":
+            return (self.n_chains, n_loop * (n_local + n_global), self.n_dim)
+        elif key == "log_prob":
+            return (self.n_chains, n_loop * (n_local + n_global))
+        elif key == "local_accs":
+            return (self.n_chains, n_loop * n_local_accs)
+        elif key == "global_accs":
+            return (self.n_chains, n_loop * n_global_accs)
+        elif key == "loss_vals":
+            return (n_loop, self.n_epochs)
+        else:
+            raise ValueError(f"Unknown summary key {key}")
 
-        production = {}
-        production["chains"] = jnp.empty((self.n_chains, 0, self.n_dim))
-        production["log_prob"] = jnp.empty((self.n_chains, 0))
-        production["local_accs"] = jnp.empty((self.n_chains, 0))
-        production["global_accs"] = jnp.empty((self.n_chains, 0))
+    def _reserve_summary(self, mode: str, n_loop: int):
+        """
+        Make sure the summary buffers have room for `n_loop` more sampling loops.
+        This only grows the buffers when sampling past the preallocated run,
+        e.g. when calling `sample` again without resetting.
 
-        self.summary = {}
-        self.summary["training"] = training
-        self.summary["production"] = production
+        Args:
+            mode (str): Either "training" or "production".
+            n_loop (int): Number of sampling loops to make room for.
+        """
+        for key, buffer in self._summary[mode].items():
+            axis = 0 if key == "loss_vals" else 1
+            n_missing = (
+                self._write_offset[mode][key]
+                + self._summary_shape(key, n_loop)[axis]
+                - buffer.shape[axis]
+            )
+            if n_missing > 0:
+                padding = [(0, 0)] * buffer.ndim
+                padding[axis] = (0, n_missing)
+                self._summary[mode][key] = jnp.pad(buffer, padding)
+
+    def _filled_summary(self, mode: str) -> dict[str, Array]:
+        """
+        The part of the summary buffers that has been written so far,
+        leaving out the room preallocated for loops that have not run.
+
+        Args:
+            mode (str): Either "training" or "production".
+        """
+        # Slicing copies the written part, except for a full buffer, which is
+        # handed out as is. Only buffers with room left are donated to a write,
+        # and a full buffer is grown into a new one by `_reserve_summary` first,
+        # so the arrays handed out stay valid.
+        summary = {}
+        for key, buffer in self._summary[mode].items():
+            offset = self._write_offset[mode][key]
+            if key == "loss_vals":
+                summary[key] = buffer[:offset]
+            else:
+                summary[key] = buffer[:, :offset]
+        return summary
+
+    def _write_summary(self, mode: str, key: str, value: Array):
+        """
+        Write `value` into the preallocated summary buffer at the current offset.
+
+        Args:
+            mode (str): Either "training" or "production".
+            key (str): Name of the summary entry.
+            value (Array): Values to write, concatenated along the step axis.
+        """
+        axis = 0 if key == "loss_vals" else 1
+        if value.shape[axis] == 0:
+            # Nothing to write, and a full buffer must not be donated.
+            return
+        offset = self._write_offset[mode][key]
+        start_indices = [0] * value.ndim
+        start_indices[axis] = offset
+        self._summary[mode][key] = _update_slice(
+            self._summary[mode][key],
+            value.astype(self._summary[mode][key].dtype),
+            start_indices,
+        )
+        self._write_offset[mode][key] = offset + value.shape[axis]
 
     def get_global_acceptance_distribution(
         self, n_bins: int = 10, training: bool = False
@@ -494,10 +871,10 @@ class Sampler:
         """
         if training is True:
             n_loop = self.n_loop_training
-            global_accs = self.summary["training"]["global_accs"]
+            global_accs = self._summary["training"]["global_accs"]
         else:
             n_loop = self.n_loop_production
-            global_accs = self.summary["production"]["global_accs"]
+            global_accs = self._summary["production"]["global_accs"]
 
         hist = [
             jnp.histogram(
@@ -527,10 +904,10 @@ class Sampler:
         """
         if training is True:
             n_loop = self.n_loop_training
-            local_accs = self.summary["training"]["local_accs"]
+            local_accs = self._summary["training"]["local_accs"]
         else:
             n_loop = self.n_loop_production
-            local_accs = self.summary["production"]["local_accs"]
+            local_accs = self._summary["production"]["local_accs"]
 
         hist = [
             jnp.histogram(
@@ -560,10 +937,10 @@ class Sampler:
         """
         if training is True:
             n_loop = self.n_loop_training
-            log_prob = self.summary["training"]["log_prob"]
+            log_prob = self._summary["training"]["log_prob"]
         else:
             n_loop = self.n_loop_production
-            log_prob = self.summary["production"]["log_prob"]
+            log_prob = self._summary["production"]["log_prob"]
 
         hist = [
             jnp.histogram(
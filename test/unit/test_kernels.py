@@ -103,7 +103,7 @@ class TestHMC:
 
     def test_HMC_close_gaussian(self):
         n_dim = 2
-        n_chains = 1
+        n_chains = 20
         HMC_obj = HMC(
             log_posterior,
             True,
@@ -122,11 +122,34 @@ class TestHMC:
         subkey = jax.random.split(subkey, n_chains)
         result = HMC_obj.sample(subkey, 10000, initial_position, None)
 
-        assert jnp.isclose(
-            jnp.mean(result[1]), 0, atol=3e-2
-        )  # sqrt(N) is the expected error, but we can get unlucky
+        # Average over many chains so the tolerance is a few standard errors
+        # and does not depend on one particular random stream.
+        assert jnp.isclose(jnp.mean(result[1]), 0, atol=3e-2)
         assert jnp.isclose(jnp.var(result[1]), 1, atol=3e-2)
 
+    def test_HMC_sample_vmap(self):
+        # Vmapping over chains should match sampling each chain on its own.
+        n_dim = 2
+        n_chains = 3
+        HMC_obj = HMC(
+            log_posterior,
+            True,
+            step_size=0.1,
+            n_leapfrog=5,
+            condition_matrix=jnp.eye(n_dim),
+        )
+
+        rng_key = jax.random.PRNGKey(42)
+        rng_key, subkey = jax.random.split(rng_key)
+        initial_position = jax.random.normal(subkey, shape=(n_chains, n_dim))
+        keys = jax.random.split(rng_key, n_chains)
+        result = HMC_obj.sample(keys, 10, initial_position, None)
+
+        for i in range(n_chains):
+            result_chain = HMC_obj.sample_chain(keys[i], 10, initial_position[i], None)
+            for value, value_chain in zip(result, result_chain):
+                assert jnp.allclose(value[i], value_chain)
+
 
 class TestMALA:
     def test_MALA_deterministic(self):
@@ -169,7 +192,7 @@ class TestMALA:
 
     def test_MALA_close_gaussian(self):
         n_dim = 2
-        n_chains = 1
+        n_chains = 20
         MALA_obj = MALA(log_posterior, True, step_size=1)
 
         rng_key = jax.random.PRNGKey(42)
@@ -185,6 +208,29 @@ class TestMALA:
         assert jnp.isclose(jnp.mean(result[1]), 0, atol=1e-2)
         assert jnp.isclose(jnp.var(result[1]), 1, atol=1e-2)
 
+    def test_MALA_sample_chain(self):
+        # Scanning over the step keys should match applying the kernel step by step.
+        n_dim = 2
+        n_steps = 5
+        MALA_obj = MALA(log_posterior, True, step_size=1)
+
+        rng_key = jax.random.PRNGKey(42)
+        initial_position = jax.random.normal(rng_key, shape=(n_dim,))
+        _, positions, log_prob, acceptance = MALA_obj.sample_chain(
+            rng_key, n_steps, initial_position, None
+        )
+
+        _, subkey = jax.random.split(rng_key)
+        position = initial_position
+        logp = log_posterior(initial_position)
+        assert jnp.allclose(positions[0], initial_position)
+        assert acceptance[0] == 0
+        for i, key in enumerate(jax.random.split(subkey, n_steps - 1)):
+            position, logp, do_accept = MALA_obj.kernel(key, position, logp, None)
+            assert jnp.allclose(positions[i + 1], position)
+            assert jnp.allclose(log_prob[i + 1], logp)
+            assert acceptance[i + 1] == do_accept
+
 
 class TestGRW:
     def test_Gaussian_random_walk_deterministic(self):
@@ -226,7 +272,7 @@ class TestGRW:
 
     def test_Gaussian_random_walk_close_gaussian(self):
         n_dim = 2
-        n_chains = 1
+        n_chains = 20
         GRW_obj = GaussianRandomWalk(log_posterior, True, step_size=1)
 
         rng_key = jax.random.PRNGKey(42)
@@ -278,3 +324,46 @@ class TestNF:
 
         initial_position = jax.random.normal(init_rng, shape=(n_chains, n_dim)) * 1
         NF_obj.sample(rng, 100, initial_position, None)
+
+    def test_NF_sample_flow_batched(self):
+        model = MaskedCouplingRQSpline(2, 2, [16, 16], 4, jax.random.PRNGKey(0))
+        n_chains, n_steps = 3, 10
+        initial_position = jnp.zeros((n_chains, 2))
+
+        # 30 proposals drawn in 4 batches of 8 samples.
+        NF_obj = NFProposal(log_posterior, True, model, n_flow_sample=9)
+        proposal, log_prob, log_prob_nf = NF_obj.sample_flow(
+            jax.random.PRNGKey(1), initial_position, None, n_steps
+        )
+        assert proposal.shape == (n_chains, n_steps, 2)
+        flat_proposal = proposal.reshape(-1, 2)
+        assert jnp.allclose(log_prob.reshape(-1), jax.vmap(log_posterior)(flat_proposal))
+        assert jnp.allclose(
+            log_prob_nf.reshape(-1), model.log_prob(flat_proposal), atol=1e-5
+        )
+
+    def test_NF_sample_flow_jit(self):
+        model = MaskedCouplingRQSpline(2, 2, [16, 16], 4, jax.random.PRNGKey(0))
+        new_model = MaskedCouplingRQSpline(2, 2, [16, 16], 4, jax.random.PRNGKey(1))
+        initial_position = jnp.zeros((3, 2))
+        NF_obj = NFProposal(log_posterior, True, model)
+        NF_obj_nojit = NFProposal(log_posterior, False, model)
+
+        # The jitted proposals match the plain ones, also after the flow is replaced.
+        for flow in [model, new_model]:
+            NF_obj.model = flow
+            NF_obj_nojit.model = flow
+            result = NF_obj.sample_flow(jax.random.PRNGKey(2), initial_position, None, 10)
+            expected = NF_obj_nojit.sample_flow(
+                jax.random.PRNGKey(2), initial_position, None, 10
+            )
+            for value, expected_value in zip(result, expected):
+                assert jnp.allclose(value, expected_value, atol=1e-5)
+
+    def test_NF_shared_logpdf_vmap(self):
+        model = MaskedCouplingRQSpline(2, 2, [16, 16], 4, jax.random.PRNGKey(0))
+        logpdf_vmap = jax.jit(jax.vmap(log_posterior, in_axes=(0, None)))
+
+        NF_obj = NFProposal(log_posterior, True, model, logpdf_vmap=logpdf_vmap)
+        assert NF_obj.logpdf_vmap is logpdf_vmap
+        assert NFProposal(log_posterior, True, model).logpdf_vmap is not logpdf_vmap
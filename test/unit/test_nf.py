@@ -1,7 +1,29 @@
 import jax
 import jax.numpy as jnp
+import numpy as np
 from flowMC.nfmodel.realNVP import RealNVP, AffineCoupling
 from flowMC.nfmodel.rqSpline import MaskedCouplingRQSpline
+from flowMC.nfmodel.common import MLP
+from flowMC.nfmodel.utils import mean_and_cov, make_training_loop
+import equinox as eqx
+import optax
+
+
+def test_mlp_stacked_hidden_layers():
+    x = jnp.array([1.0, 2.0, 3.0])
+    model = MLP([3, 8, 8, 8, 2], jax.random.PRNGKey(0), scale=1.0)
+
+    assert model.hidden_weight.shape == (2, 8, 8)
+    assert model.hidden_bias.shape == (2, 8)
+    assert jnp.all(jnp.abs(model.hidden_bias) <= 1 / jnp.sqrt(8))
+    assert not jnp.allclose(model.hidden_weight[0], model.hidden_weight[1])
+
+    y = jax.nn.relu(model.layers[0](x))
+    for weight, bias in zip(model.hidden_weight, model.hidden_bias):
+        y = jax.nn.relu(weight @ y + bias)
+    y = model.layers[-1](y)
+
+    assert jnp.allclose(model(x), y)
 
 
 def test_affine_coupling_forward_and_inverse():
@@ -70,3 +92,67 @@ def test_rqspline():
     log_prob = model.log_prob(samples)
 
     assert log_prob.shape == (2,)
+
+
+def test_mean_and_cov():
+    x = jax.random.normal(jax.random.PRNGKey(0), (1000, 3)) + jnp.array([1.0, 10.0, 100.0])
+
+    mean, cov = mean_and_cov(x)
+
+    assert jnp.allclose(mean, jnp.mean(x, axis=0))
+    assert jnp.allclose(cov, jnp.cov(x.T), atol=1e-4)
+
+    # A mean far larger than the spread cancels out in float32 without the shift.
+    x = jax.random.normal(jax.random.PRNGKey(1), (10000, 3))
+    x = x * jnp.array([1.0, 0.1, 0.01]) + jnp.array([1.0, 100.0, 1000.0])
+    expected = np.cov(np.asarray(x, dtype=np.float64).T)
+    scale = np.sqrt(np.outer(np.diag(expected), np.diag(expected)))
+
+    _, cov = mean_and_cov(x)
+
+    assert np.all(np.abs(cov - expected) < 1e-2 * scale)
+
+
+def test_mixed_precision_training():
+    x = jax.random.normal(jax.random.PRNGKey(0), (100, 3))
+    model = MaskedCouplingRQSpline(3, 2, [16, 16], 4, jax.random.PRNGKey(1))
+    optim = optax.adam(1e-3)
+    state = optim.init(eqx.filter(model, eqx.is_array))
+
+    _, _, train_step = make_training_loop(optim, compute_dtype=jnp.bfloat16)
+    loss, new_model, state = train_step(model, x, state)
+
+    assert loss.dtype != jnp.bfloat16
+    for leaf, new_leaf in zip(
+        jax.tree_util.tree_leaves(eqx.filter(model, eqx.is_inexact_array)),
+        jax.tree_util.tree_leaves(eqx.filter(new_model, eqx.is_inexact_array)),
+    ):
+        assert new_leaf.dtype == leaf.dtype
+
+
+def test_gradient_accumulation():
+    x = jax.random.normal(jax.random.PRNGKey(0), (100, 3))
+    model = MaskedCouplingRQSpline(3, 2, [16, 16], 4, jax.random.PRNGKey(1))
+    optim = optax.sgd(1e-3)
+    optim_accum = optax.MultiSteps(optim, every_k_schedule=4)
+    state = optim.init(eqx.filter(model, eqx.is_array))
+    state_accum = optim_accum.init(eqx.filter(model, eqx.is_inexact_array))
+
+    _, _, train_step = make_training_loop(optim)
+    _, _, train_step_accum = make_training_loop(optim_accum)
+    _, new_model, _ = train_step(model, x, state)
+    new_model_accum = model
+    for batch in x.reshape(4, 25, 3):
+        # The parameters only change once all the micro-batches are accumulated.
+        assert eqx.tree_equal(new_model_accum, model)
+        _, new_model_accum, state_accum = train_step_accum(
+            new_model_accum, batch, state_accum
+        )
+    assert not eqx.tree_equal(new_model_accum, model)
+
+    # Equal sized micro-batches average to the full batch gradient.
+    for leaf, leaf_accum in zip(
+        jax.tree_util.tree_leaves(eqx.filter(new_model, eqx.is_inexact_array)),
+        jax.tree_util.tree_leaves(eqx.filter(new_model_accum, eqx.is_inexact_array)),
+    ):
+        assert jnp.allclose(leaf, leaf_accum, atol=1e-5)
@@ -0,0 +1,308 @@
+import json
+import os
+import pickle
+import subprocess
+import sys
+
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pytest
+
+from flowMC.nfmodel.rqSpline import MaskedCouplingRQSpline
+from flowMC.sampler.MALA import MALA
+from flowMC.sampler.Sampler import Sampler
+
+
+def log_posterior(x, data):
+    return -0.5 * jnp.sum((x - data["mu"]) ** 2)
+
+
+data = {"mu": jnp.ones(2)}
+
+
+def make_sampler(**kwargs):
+    key = jax.random.PRNGKey(0)
+    model = MaskedCouplingRQSpline(2, 2, [8, 8], 4, key)
+    config = dict(
+        n_chains=10,
+        n_local_steps=10,
+        n_global_steps=10,
+        n_loop_training=2,
+        n_loop_production=2,
+        n_epochs=2,
+        batch_size=100,
+        n_max_examples=100,
+    )
+    config.update(kwargs)
+    return Sampler(2, key, data, MALA(log_posterior, True, step_size=0.3), model, **config)
+
+
+def test_production_scan():
+    initial_position = jax.random.normal(jax.random.PRNGKey(1), (10, 2))
+    sampler = make_sampler(n_loop_production=3)
+    last_step = sampler.production_run(initial_position, data)
+
+    # The scan runs the same loops as calling sampling_loop one by one.
+    sampler_loop = make_sampler(n_loop_production=3)
+    loop_keys = sampler_loop._split_loop_keys(3)
+    last_step_loop = initial_position
+    for i in range(3):
+        last_step_loop = sampler_loop.sampling_loop(
+            last_step_loop, data, rng_keys=loop_keys[i]
+        )
+
+    np.testing.assert_allclose(last_step, last_step_loop, rtol=1e-5, atol=1e-5)
+    state, state_loop = sampler.get_sampler_state(), sampler_loop.get_sampler_state()
+    for key in state:
+        np.testing.assert_allclose(state[key], state_loop[key], rtol=1e-5, atol=1e-5)
+
+
+def test_split_loop_keys():
+    sampler = make_sampler()
+    keys = sampler._split_loop_keys(3)
+    more_keys = sampler._split_loop_keys(2)
+    assert keys.shape == (3, 11, 2)
+    assert more_keys.shape == (2, 11, 2)
+
+    # The same rng_key gives the same loop keys.
+    np.testing.assert_array_equal(make_sampler()._split_loop_keys(3), keys)
+
+    # No key is used twice, across loops, chains, calls or the next rng_key.
+    all_keys = np.concatenate(
+        [keys.reshape(-1, 2), more_keys.reshape(-1, 2), sampler.rng_key[None]]
+    )
+    assert len(np.unique(all_keys, axis=0)) == len(all_keys)
+
+
+def test_numpy_inputs():
+    initial_position = jax.random.normal(jax.random.PRNGKey(1), (10, 2))
+    sampler = make_sampler()
+    sampler.sample(initial_position, data)
+
+    # Inputs on the host are moved to the device once and sample the same.
+    sampler_numpy = make_sampler()
+    sampler_numpy.sample(
+        np.asarray(initial_position), {"mu": np.asarray(data["mu"])}
+    )
+    for training in [True, False]:
+        state = sampler.get_sampler_state(training=training)
+        state_numpy = sampler_numpy.get_sampler_state(training=training)
+        for key in state:
+            np.testing.assert_allclose(state[key], state_numpy[key], rtol=1e-6)
+
+
+def test_shared_likelihood_vec():
+    sampler = make_sampler()
+    # The global sampler evaluates the target with the local sampler's vmapped logpdf.
+    assert sampler._global_sampler.logpdf_vmap is sampler.likelihood_vec
+    assert sampler.likelihood_vec is sampler.local_sampler.logpdf_vmap
+
+
+def test_keep_quantile():
+    sampler = make_sampler(keep_quantile=0.5)
+    initial_position = jax.random.normal(jax.random.PRNGKey(1), (10, 2))
+    last_step = sampler.global_sampler_tuning(initial_position, data)
+
+    chains = sampler.get_sampler_state(training=True)["chains"]
+    assert chains.shape == (10, 40, 2)
+    # Every chain keeps running, and each global step starts where the local step ended.
+    assert jnp.all(jnp.any(chains[:, 10:20] != 0, axis=(1, 2)))
+    assert jnp.all(chains[:, 10] == chains[:, 9])
+    assert jnp.all(chains[:, 30] == chains[:, 29])
+    assert jnp.all(last_step == chains[:, -1])
+
+
+def test_chain_method():
+    initial_position = jax.random.normal(jax.random.PRNGKey(1), (10, 2))
+    states = []
+    for chain_method in ["vectorized", "sequential"]:
+        sampler = make_sampler(chain_method=chain_method, use_global=False)
+        sampler.production_run(initial_position, data)
+        states.append(sampler.get_sampler_state())
+    for key in ["chains", "log_prob", "local_accs"]:
+        np.testing.assert_allclose(states[0][key], states[1][key], rtol=1e-6, atol=1e-6)
+
+    with pytest.raises(ValueError):
+        make_sampler(chain_method="parallel")
+
+
+def test_accum_steps():
+    # Two batches per epoch are accumulated into one update of the flow.
+    sampler = make_sampler(accum_steps=2, batch_size=50)
+    model = sampler.nf_model
+    initial_position = jax.random.normal(jax.random.PRNGKey(1), (10, 2))
+    sampler.sampling_loop(initial_position, data, training=True)
+    # Leave out the data statistics, which are set without training.
+    model = eqx.tree_at(
+        lambda m: (m._data_mean, m._data_cov),
+        model,
+        (sampler.nf_model._data_mean, sampler.nf_model._data_cov),
+    )
+    assert not eqx.tree_equal(sampler.nf_model, model)
+
+    # A whole batch per epoch leaves nothing to accumulate.
+    with pytest.raises(ValueError):
+        make_sampler(accum_steps=2)
+
+
+def test_summary_partial_run(tmp_path):
+    sampler = make_sampler(n_loop_production=3)
+    initial_position = jax.random.normal(jax.random.PRNGKey(1), (10, 2))
+    sampler.sampling_loop(initial_position, data)
+
+    # Only the loop that ran is returned, not the preallocated room for the others.
+    state = sampler.get_sampler_state()
+    assert state["chains"].shape == (10, 20, 2)
+    assert state["log_prob"].shape == (10, 20)
+    assert state["local_accs"].shape == (10, 9)
+    assert state["global_accs"].shape == (10, 9)
+    assert jnp.all(jnp.any(state["chains"] != 0, axis=2))
+    assert sampler.get_sampler_state(training=True)["loss_vals"].shape == (0, 2)
+
+    sampler.save_summary(str(tmp_path / "summary.pickle"))
+    with open(tmp_path / "summary.pickle", "rb") as f:
+        summary = pickle.load(f)
+    assert summary["production"]["chains"].shape == (10, 20, 2)
+
+
+def test_summary_after_more_loops():
+    sampler = make_sampler(n_loop_training=1, n_loop_production=1)
+    initial_position = jax.random.normal(jax.random.PRNGKey(1), (10, 2))
+
+    # Fill the preallocated buffers, then write past them. The states handed out
+    # before must stay valid even though the buffers are donated on every write.
+    last_step = sampler.sampling_loop(initial_position, data, training=True)
+    training = sampler.get_sampler_state(training=True)
+    last_step = sampler.sampling_loop(last_step, data, training=True)
+    new_training = sampler.get_sampler_state(training=True)
+    sampler.production_run(last_step, data)
+    production = sampler.get_sampler_state()
+    sampler.production_run(last_step, data)
+    new_production = sampler.get_sampler_state()
+
+    for state, new_state in [(training, new_training), (production, new_production)]:
+        assert state["chains"].shape == (10, 20, 2)
+        assert new_state["chains"].shape == (10, 40, 2)
+        for key, value in state.items():
+            n_written = value.shape[0 if key == "loss_vals" else 1]
+            np.testing.assert_array_equal(
+                np.asarray(value),
+                np.asarray(new_state[key])[:n_written]
+                if key == "loss_vals"
+                else np.asarray(new_state[key])[:, :n_written],
+            )
+
+
+def test_summary_not_copied():
+    sampler = make_sampler(n_loop_production=1, use_global=False)
+    initial_position = jax.random.normal(jax.random.PRNGKey(1), (10, 2))
+    last_step = sampler.production_run(initial_position, data)
+
+    # A full buffer is handed out as is, and is not donated when sampling continues.
+    state = sampler.get_sampler_state()
+    assert state["chains"] is sampler.summary["production"]["chains"]
+    assert state["global_accs"].shape == (10, 0)
+    sampler.production_run(last_step, data)
+    for key, value in state.items():
+        new_value = sampler.get_sampler_state()[key]
+        np.testing.assert_array_equal(value, new_value[:, : value.shape[1]])
+
+
+def test_summary_keys():
+    sampler = make_sampler()
+    sampler.sample(jax.random.normal(jax.random.PRNGKey(1), (10, 2)), data)
+
+    # The states are unpacked with `.values()`, so the order of the keys matters.
+    keys = ["chains", "log_prob", "local_accs", "global_accs"]
+    assert list(sampler.get_sampler_state().keys()) == keys
+    assert list(sampler.get_sampler_state(training=True).keys()) == keys + ["loss_vals"]
+
+
+def test_verbose():
+    sampler = make_sampler(verbose=True)
+    sampler.sample(jax.random.normal(jax.random.PRNGKey(1), (10, 2)), data)
+
+    for training in [True, False]:
+        chains = sampler.get_sampler_state(training=training)["chains"]
+        assert chains.shape == (10, 40, 2)
+        assert jnp.all(jnp.any(chains != 0, axis=2))
+
+
+# Runs a sampler in a fresh process, since the number of host devices
+# can only be set before jax is imported. n_devices is the number of devices
+# the chains ended up on.
+MULTI_DEVICE_SCRIPT = """
+import json
+import sys
+import jax
+import jax.numpy as jnp
+import numpy as np
+from flowMC.nfmodel.rqSpline import MaskedCouplingRQSpline
+from flowMC.sampler.MALA import MALA
+from flowMC.sampler.Sampler import Sampler
+
+
+def log_posterior(x, data):
+    return -0.5 * jnp.sum((x - data["mu"]) ** 2)
+
+
+data = {"mu": jnp.ones(2)}
+key = jax.random.PRNGKey(0)
+model = MaskedCouplingRQSpline(2, 2, [8, 8], 4, key)
+sampler = Sampler(
+    2,
+    key,
+    data,
+    MALA(log_posterior, True, step_size=0.3),
+    model,
+    n_chains=4,
+    n_local_steps=10,
+    n_global_steps=10,
+    n_loop_training=2,
+    n_loop_production=2,
+    n_epochs=2,
+    batch_size=40,
+    n_max_examples=40,
+    **json.loads(sys.argv[2]),
+)
+last_step = jnp.zeros((4, 2))
+for _ in range(sampler.n_loop_training):
+    last_step = sampler.sampling_loop(last_step, data, training=True)
+last_step = sampler.production_run(last_step, data)
+np.savez(
+    sys.argv[1],
+    n_devices=len(last_step.sharding.device_set),
+    training=sampler.get_sampler_state(training=True)["chains"],
+    production=sampler.get_sampler_state()["chains"],
+)
+"""
+
+
+def run_on_devices(n_devices, path, **kwargs):
+    env = dict(os.environ)
+    env["XLA_FLAGS"] = f"--xla_force_host_platform_device_count={n_devices}"
+    subprocess.run(
+        [sys.executable, "-c", MULTI_DEVICE_SCRIPT, path, json.dumps(kwargs)],
+        env=env,
+        check=True,
+    )
+    return np.load(path)
+
+
+@pytest.mark.parametrize(
+    "kwargs", [dict(use_global=False), dict(use_global=True, keep_quantile=0.5)]
+)
+def test_sampler_multi_device(tmp_path, kwargs):
+    single = run_on_devices(1, str(tmp_path / "single.npz"), **kwargs)
+    multi = run_on_devices(2, str(tmp_path / "multi.npz"), **kwargs)
+
+    assert single["n_devices"] == 1
+    assert multi["n_devices"] == 2
+    for mode in ["training", "production"]:
+        chains = multi[mode]
+        # All chains start at zero, they only differ through their keys.
+        for i in range(1, chains.shape[0]):
+            assert not np.allclose(chains[0, 1:], chains[i, 1:])
+        np.testing.assert_allclose(chains, single[mode], rtol=1e-6, atol=1e-6)